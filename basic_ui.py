@@ -1,21 +1,23 @@
+import asyncio
 import difflib
+import functools
 import gradio as gr
-import matplotlib.patches as patches
-import matplotlib.pyplot as plt
-import nltk
-import numpy as np
+import hashlib
+import io
 import os
+import random
 import re
+import requests
+import shelve
+import threading
+import time
 import unicodedata
 
-from jiwer import cer, mer, wer, wil
-from nltk.tokenize import word_tokenize
-from nltk.translate.bleu_score import sentence_bleu as nltk_sentence_bleu
-from nltk.translate.chrf_score import sentence_chrf
-from nltk.translate.meteor_score import single_meteor_score
+from collections.abc import AsyncIterator
+from http.cookiejar import DefaultCookiePolicy
 from num2words import num2words
-from PIL import Image
-from sacrebleu import sentence_bleu
+from PIL import Image, ImageDraw, ImageFont
+from requests.adapters import HTTPAdapter
 from supercontrast.client import supercontrast_client
 from supercontrast.provider import Provider
 from supercontrast.task import (
@@ -26,11 +28,6 @@ from supercontrast.task import (
     TranslationRequest,
 )
 
-# initialize nltk
-nltk.download("punkt")
-nltk.download("punkt_tab")
-nltk.download("wordnet")
-
 # Constants
 TEST_IMAGE_URL = "https://jeroen.github.io/images/testocr.png"
 TEST_AUDIO_URL = "https://github.com/voxserv/audio_quality_testing_samples/raw/master/mono_44100/127389__acclivity__thetimehascome.wav"
@@ -46,11 +43,103 @@ PROVIDERS = [
     Provider.API4AI,
 ]
 
-OCR_PROVIDERS = ["API4AI", "AWS", "AZURE", "CLARIFAI", "GCP", "SENTISIGHT"]
+OCR_PROVIDERS = ("API4AI", "AWS", "AZURE", "CLARIFAI", "GCP", "SENTISIGHT")
+TRANSCRIPTION_PROVIDERS = ("AZURE", "OPENAI")
+TRANSLATION_PROVIDERS = ("ANTHROPIC", "AWS", "AZURE", "GCP", "MODERNMT", "OPENAI")
+
+# Provider names as used in the UI mapped to their enum members
+PROVIDER_ENUM = {provider.name: provider for provider in Provider}
 
 # Define output directory for saving plots
 OUTPUT_DIR = "test_data/ocr"
 
+# Set up by setup_http_pooling(), original_requests_request restores requests
+original_requests_request = requests.api.request
+pooled_session = None
+
+# Largest width or height of the images OCR results are drawn on
+MAX_RENDER_SIZE = 2048
+
+# Placeholder for providers that were not selected
+BLANK_IMAGE = Image.new("RGB", (1, 1), (255, 255, 255))
+
+# Provider responses are cached on disk by input content for a week, keeping
+# at most RESPONSE_CACHE_MAX_ENTRIES of the most recently stored responses.
+# Set SUPERCONTRAST_RESPONSE_CACHE=0 to always call the providers live
+RESPONSE_CACHE_ENABLED = os.environ.get("SUPERCONTRAST_RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_PATH = os.path.expanduser("~/.cache/supercontrast/responses")
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_INDEX_KEY = "__index__"
+response_cache_lock = threading.Lock()
+response_cache = None
+
+# nltk data is downloaded once in the background when the demo launches
+NLTK_RESOURCES = (
+    ("punkt", "tokenizers/punkt"),
+    ("punkt_tab", "tokenizers/punkt_tab"),
+    ("wordnet", "corpora/wordnet"),
+)
+NLTK_RETRY_INTERVAL = 10 * 60
+nltk_lock = threading.Lock()
+nltk_ready = False
+nltk_next_attempt = 0
+
+# Concurrent requests allowed per task and provider, and retries on rate
+# limit errors. Limits are per task since e.g. AWS Textract and AWS
+# Translate are separate services with separate quotas
+MAX_CONCURRENT_REQUESTS = 4
+MAX_ATTEMPTS = 3
+RATE_LIMIT_ERROR_NAMES = {
+    "RateLimitError",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequests",
+    "TooManyRequestsException",
+}
+provider_semaphores = {
+    (task, provider.name): asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    for task in Task
+    for provider in Provider
+}
+
+
+def setup_http_pooling():
+    # Several provider handlers call requests.get/post directly, which opens a
+    # new connection per call. Route them through one pooled session instead.
+    #
+    # This patches requests.request for the whole process: every library using
+    # the module-level requests functions shares this session across worker
+    # threads. The session never keeps cookies, since it is shared by all
+    # users. Call teardown_http_pooling() to restore the original function
+    global pooled_session
+    if pooled_session is not None:
+        return
+
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def pooled_request(method, url, **kwargs):
+        return session.request(method=method, url=url, **kwargs)
+
+    pooled_session = session
+    requests.api.request = pooled_request
+    requests.request = pooled_request
+
+
+def teardown_http_pooling():
+    global pooled_session
+    if pooled_session is None:
+        return
+
+    requests.api.request = original_requests_request
+    requests.request = original_requests_request
+    pooled_session.close()
+    pooled_session = None
+
 
 def get_image_path(image_input):
     if isinstance(image_input, str):
@@ -66,104 +155,326 @@ def get_image_path(image_input):
             return image_input
         else:
             raise ValueError(f"Invalid image path: {image_input}")
+    elif isinstance(image_input, bytes):
+        return image_input
     elif isinstance(image_input, Image.Image):
-        # If it's already a PIL Image, save it temporarily and return the path
-        temp_path = os.path.join(OUTPUT_DIR, "temp_input_image.png")
-        image_input.save(temp_path)
-        return temp_path
+        # If it's already a PIL Image, encode it in memory, OCRRequest accepts bytes
+        buffer = io.BytesIO()
+        image_input.save(buffer, format="PNG", compress_level=1, optimize=False)
+        return buffer.getvalue()
     else:
         raise ValueError(f"Unsupported image input type: {type(image_input)}")
 
 
-def plot_bounding_boxes(
-    image_path: str, responses: dict[Provider, OCRResponse], output_dir: str
+def render_bounding_boxes(
+    provider: Provider,
+    ocr_response: OCRResponse,
+    img: Image.Image,
+    scale: float,
+    font,
+    output_dir: str,
+    image_name: str,
 ):
-    # Ensure we have a valid file path
+    # Draw directly on a copy of the image for each provider
+    img_result = img.copy()
+    draw = ImageDraw.Draw(img_result, "RGBA")
+
+    for box in ocr_response.bounding_boxes:
+        # Box coordinates refer to the original image size, and corners can
+        # come back reversed for rotated text
+        (x0, y0), (x2, y2) = box.coordinates[0], box.coordinates[2]
+        x0, x2 = sorted((x0 * scale, x2 * scale))
+        y0, y2 = sorted((y0 * scale, y2 * scale))
+        draw.rectangle([(x0, y0), (x2, y2)], outline=(255, 0, 0, 255), width=1)
+
+        # Add text annotation on a translucent white background
+        draw.rectangle(
+            draw.textbbox((x0, y0), box.text, font=font),
+            fill=(255, 255, 255, 178),
+        )
+        draw.text((x0, y0), box.text, fill=(0, 0, 255, 255), font=font)
+
+    # Save the annotated image, favouring encode speed over file size for PNGs
+    output_path = os.path.join(output_dir, f"ocr_{str(provider)}_{image_name}")
+    img_result.save(output_path, compress_level=3)
+    print(f"Saved {str(provider)} plot to: {output_path}")
+
+    return {"image": img_result, "text": ocr_response.all_text}
+
+
+def load_source_image(image_path: str | bytes):
+    # Ensure we have a valid file path or in-memory image
     image_path = get_image_path(image_path)
 
-    img = Image.open(image_path)
+    if isinstance(image_path, bytes):
+        image_file = io.BytesIO(image_path)
+        # Name outputs by content so concurrent in-memory inputs don't collide
+        image_name = f"{hashlib.sha256(image_path).hexdigest()[:12]}.png"
+    else:
+        image_file = image_path
+        image_name = os.path.basename(image_path)
+
+    # Decode the source image once up front, renderers only copy it. JPEGs are
+    # decoded straight at reduced size so the full resolution is never built
+    with Image.open(image_file) as source:
+        original_width = source.width
+        source.draft("RGB", (MAX_RENDER_SIZE, MAX_RENDER_SIZE))
+        img = source.convert("RGB")
+    img.load()
+
+    # Only the rendering copy is downscaled, OCR requests use the original
+    img.thumbnail((MAX_RENDER_SIZE, MAX_RENDER_SIZE), Image.LANCZOS)
+    scale = img.width / original_width
+
+    return img, image_name, scale
+
+
+@functools.lru_cache(maxsize=64)
+def get_client(task, provider, source_language=None, target_language=None):
+    # Reuse clients across clicks so SDK sessions and connection pools persist
+    config = {}
+    if source_language is not None:
+        config["source_language"] = source_language
+    if target_language is not None:
+        config["target_language"] = target_language
+    return supercontrast_client(
+        task=task, providers=[PROVIDER_ENUM[provider]], **config
+    )
 
-    results = {}
-    for provider, ocr_response in responses.items():
-        # Create a new figure for each provider
-        fig, ax = plt.subplots(figsize=(10, 10))
-        ax.imshow(img)
-
-        for box in ocr_response.bounding_boxes:
-            # Create a Rectangle patch
-            rect = patches.Rectangle(
-                (box.coordinates[0][0], box.coordinates[0][1]),
-                box.coordinates[2][0] - box.coordinates[0][0],
-                box.coordinates[2][1] - box.coordinates[0][1],
-                linewidth=1,
-                edgecolor="r",
-                facecolor="none",
-            )
-            # Add the patch to the Axes
-            ax.add_patch(rect)
-
-            # Add text annotation
-            ax.text(
-                box.coordinates[0][0],
-                box.coordinates[0][1],
-                box.text,
-                color="blue",
-                fontsize=8,
-                bbox=dict(facecolor="white", alpha=0.7),
-            )
 
-        ax.axis("off")
+def request_digest(task, provider, request, **config):
+    digest = hashlib.sha256(repr((task, provider, sorted(config.items()))).encode())
+    if isinstance(request, OCRRequest):
+        if isinstance(request.image, bytes):
+            digest.update(request.image)
+        else:
+            with open(request.image, "rb") as f:
+                digest.update(f.read())
+    elif isinstance(request, TranscriptionRequest):
+        with open(request.audio_file, "rb") as f:
+            digest.update(f.read())
+    else:
+        digest.update(request.text.encode())
+    return digest.hexdigest()
 
-        # Remove any extra white space around the image
-        plt.tight_layout(pad=0)
-        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
 
-        # Convert plot to PIL Image
-        fig.canvas.draw()
-        img_array = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)  # type: ignore
-        img_array = img_array.reshape(fig.canvas.get_width_height()[::-1] + (3,))
-        img_result = Image.fromarray(img_array)
+def get_response_cache():
+    # The shelve is opened once and kept open, callers must hold
+    # response_cache_lock while using it
+    global response_cache
+    if response_cache is None:
+        os.makedirs(os.path.dirname(RESPONSE_CACHE_PATH), exist_ok=True)
+        response_cache = shelve.open(RESPONSE_CACHE_PATH)
+    return response_cache
 
-        # Save the plot as an image file
-        os.makedirs(output_dir, exist_ok=True)
-        image_name = os.path.basename(image_path)
-        output_path = os.path.join(output_dir, f"ocr_{str(provider)}_{image_name}")
-        img_result.save(output_path)
-        print(f"Saved {str(provider)} plot to: {output_path}")
 
-        # Store the image and text result
-        results[provider] = {"image": img_result, "text": ocr_response.all_text}
+def load_cache_index(cache):
+    # Maps each cached key to the time it was stored, so eviction never has to
+    # unpickle responses. Without a readable index nothing can be evicted
+    try:
+        return cache.get(RESPONSE_CACHE_INDEX_KEY, {})
+    except Exception:
+        cache.clear()
+        return {}
 
-        plt.close(fig)
 
-    return results
+def evict_cached_response(cache, index, key):
+    index.pop(key, None)
+    if key in cache:
+        del cache[key]
 
 
-def process_ocr(image, providers):
-    image_path = get_image_path(image)
-    results = {}
-    for provider in providers:
-        client = supercontrast_client(task=Task.OCR, providers=[Provider[provider]])
-        response = client.request(OCRRequest(image=image_path))
-        results[Provider[provider]] = response
+def read_cached_response(key):
+    # Hits only read their own entry, the index is only rewritten on eviction
+    with response_cache_lock:
+        cache = get_response_cache()
+        try:
+            stored_at, response = cache[key]
+        except KeyError:
+            return None
+        except Exception:
+            # Unreadable entries, e.g. after an SDK model change, are misses
+            stored_at, response = 0, None
+
+        if time.time() - stored_at >= RESPONSE_CACHE_TTL:
+            index = load_cache_index(cache)
+            evict_cached_response(cache, index, key)
+            cache[RESPONSE_CACHE_INDEX_KEY] = index
+            cache.sync()
+            return None
+        return response
+
+
+def write_cached_response(key, response):
+    now = time.time()
+    with response_cache_lock:
+        cache = get_response_cache()
+        index = load_cache_index(cache)
+        cache[key] = (now, response)
+        index[key] = now
+
+        # Drop expired entries, then the oldest ones over the cap
+        for old_key, stored_at in list(index.items()):
+            if now - stored_at >= RESPONSE_CACHE_TTL:
+                evict_cached_response(cache, index, old_key)
+        overflow = len(index) - RESPONSE_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            for old_key in sorted(index, key=index.get)[:overflow]:
+                evict_cached_response(cache, index, old_key)
+
+        cache[RESPONSE_CACHE_INDEX_KEY] = index
+        cache.sync()
+
+
+def request_provider(task, provider, request, **config):
+    # supercontrast clients are synchronous, so this runs in a worker thread
+    if not RESPONSE_CACHE_ENABLED:
+        return get_client(task, provider, **config).request(request)
+
+    key = request_digest(task, provider, request, **config)
+    cached = read_cached_response(key)
+    if cached is not None:
+        return cached
+
+    client = get_client(task, provider, **config)
+    response = client.request(request)
+
+    write_cached_response(key, response)
+    return response
 
-    plot_results = plot_bounding_boxes(image_path, results, OUTPUT_DIR)
 
+def is_rate_limit_error(error):
+    # HTTP status from the error itself, an attached requests/httpx response,
+    # or botocore's response dict
+    status_code = getattr(error, "status_code", None)
+    error_code = None
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        status_code = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        error_code = response.get("Error", {}).get("Code")
+    elif status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code == 429:
+        return True
+
+    # Known rate limit exception classes and botocore error codes
+    error_names = {cls.__name__ for cls in type(error).__mro__}
+    if error_code is not None:
+        error_names.add(error_code)
+    if error_names & RATE_LIMIT_ERROR_NAMES:
+        return True
+
+    return re.search(r"\b429\b", str(error)) is not None
+
+
+async def request_provider_with_retry(task, provider, request, **config):
+    # Limit in-flight requests per provider and back off when rate limited.
+    # A provider call can't be interrupted once its worker thread starts, so
+    # on cancellation the slot is only released when that thread returns
+    semaphore = provider_semaphores[(task, provider)]
+    await semaphore.acquire()
+    release_on_exit = True
+
+    def release_when_done(call):
+        if not call.cancelled():
+            call.exception()  # retrieved so the orphaned error isn't logged
+        semaphore.release()
+
+    try:
+        for attempt in range(MAX_ATTEMPTS):
+            call = asyncio.ensure_future(
+                asyncio.to_thread(request_provider, task, provider, request, **config)
+            )
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                release_on_exit = False
+                call.add_done_callback(release_when_done)
+                raise
+            except Exception as error:
+                if attempt == MAX_ATTEMPTS - 1 or not is_rate_limit_error(error):
+                    raise
+            await asyncio.sleep(2**attempt + random.random())
+    finally:
+        if release_on_exit:
+            semaphore.release()
+
+
+async def request_providers(task, providers, request, postprocess=None, **config):
+    # Fan out one request per provider and yield each response as it arrives.
+    # postprocess(provider, response) runs in a worker thread per provider, so
+    # responses that land together are processed in parallel. A failing
+    # provider yields its exception so the others still complete
+    async def request_one(provider):
+        try:
+            response = await request_provider_with_retry(
+                task, provider, request, **config
+            )
+            if postprocess is not None:
+                response = await asyncio.to_thread(postprocess, provider, response)
+        except Exception as error:
+            response = error
+        return provider, response
+
+    tasks = [asyncio.create_task(request_one(provider)) for provider in providers]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield await completed
+    finally:
+        # Stop waiting on providers if the consumer stops early. Calls already
+        # in a worker thread still run to completion and hold their slot
+        for task in tasks:
+            task.cancel()
+
+
+def ocr_outputs(plot_results):
     response = []
     for provider in OCR_PROVIDERS:
-        if Provider[provider] in plot_results:
+        provider_enum = PROVIDER_ENUM[provider]
+        if provider_enum in plot_results:
             response.extend(
                 [
-                    plot_results[Provider[provider]]["image"],
-                    plot_results[Provider[provider]]["text"],
+                    plot_results[provider_enum]["image"],
+                    plot_results[provider_enum]["text"],
                 ]
             )
         else:
-            response.extend([Image.open("dummy.png"), "foo bar"])
+            response.extend([BLANK_IMAGE, ""])
 
     return response
 
 
+async def process_ocr(image, providers):
+    # Encoding a PIL input to PNG is CPU-bound, keep it off the event loop
+    image_path = await asyncio.to_thread(get_image_path, image)
+    img, image_name, scale = await asyncio.to_thread(load_source_image, image_path)
+    font = ImageFont.load_default()
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    def render(provider, ocr_response):
+        return render_bounding_boxes(
+            PROVIDER_ENUM[provider],
+            ocr_response,
+            img,
+            scale,
+            font,
+            OUTPUT_DIR,
+            image_name,
+        )
+
+    # Clear previous results, then show each provider as soon as it is rendered
+    plot_results = {}
+    yield ocr_outputs(plot_results)
+
+    async for provider, result in request_providers(
+        Task.OCR, providers, OCRRequest(image=image_path), postprocess=render
+    ):
+        if isinstance(result, Exception):
+            result = {"image": BLANK_IMAGE, "text": f"Error: {result}"}
+        plot_results[PROVIDER_ENUM[provider]] = result
+        yield ocr_outputs(plot_results)
+
+
 def normalize_text(text, task="transcription"):
     # Convert to lowercase
     text = text.lower()
@@ -223,6 +534,9 @@ def word_by_word_diff(text1, text2):
 
 
 def calculate_transcription_metrics(reference, hypothesis):
+    # Imported on first use, metrics are only needed with an expected text
+    from jiwer import cer, mer, wer, wil
+
     # Word-level metrics
     wer_score = wer(reference, hypothesis)
     mer_score = mer(reference, hypothesis)
@@ -245,54 +559,96 @@ WIP (Word Information Preserved): {wip_score:.4f}
 WRR (Word Recognition Rate): {wrr_score:.4f}"""
 
 
-def process_transcription(audio, providers, expected_transcription=None) -> list[str]:
+def format_transcription_result(
+    provider, text, expected_transcription, normalized_expected
+):
+    normalized_text = normalize_text(text)
+    line_diff = line_by_line_diff(normalized_expected, normalized_text)
+    word_diff = word_by_word_diff(normalized_expected, normalized_text)
+    metrics = calculate_transcription_metrics(normalized_expected, normalized_text)
+    if not line_diff:
+        line_diff = "No differences found."
+    if word_diff == normalized_expected:
+        word_diff = "No differences found."
+
+    return (
+        f"Transcriptions:\n"
+        f"{provider}: {text}\n"
+        f"Expected: {expected_transcription}\n\n"
+        f"Normalized Transcriptions:\n"
+        f"{provider}: {normalized_text}\n"
+        f"Expected: {normalized_expected}\n\n"
+        f"Diff (Normalized, line-by-line):\n{line_diff}\n\n"
+        f"Diff (Normalized, word-by-word):\n{word_diff}\n\n"
+        f"Metrics:\n{metrics}"
+    )
+
+
+async def process_transcription(
+    audio, providers, expected_transcription=None
+) -> AsyncIterator[list[str]]:
     results = {}
-    for provider in providers:
-        client = supercontrast_client(
-            task=Task.TRANSCRIPTION, providers=[Provider[provider]]
-        )
-        response = client.request(TranscriptionRequest(audio_file=audio))
-        results[provider] = response.text
+    yield [results.get(provider, "") for provider in TRANSCRIPTION_PROVIDERS]
 
     if expected_transcription:
-        normalized_expected = normalize_text(expected_transcription)
-        for provider, text in results.items():
-            normalized_text = normalize_text(text)
-            line_diff = line_by_line_diff(normalized_expected, normalized_text)
-            word_diff = word_by_word_diff(normalized_expected, normalized_text)
-            metrics = calculate_transcription_metrics(
-                normalized_expected, normalized_text
-            )
-            results[provider] = {
-                "original": text,
-                "normalized": normalized_text,
-                "line_diff": line_diff if line_diff else "No differences found.",
-                "word_diff": (
-                    word_diff
-                    if word_diff != normalized_expected
-                    else "No differences found."
-                ),
-                "metrics": metrics,
-            }
-
-        return [
-            f"Transcriptions:\n"
-            f"{provider}: {results.get(provider, {}).get('original', '')}\n"
-            f"Expected: {expected_transcription}\n\n"
-            f"Normalized Transcriptions:\n"
-            f"{provider}: {results.get(provider, {}).get('normalized', '')}\n"
-            f"Expected: {normalized_expected}\n\n"
-            f"Diff (Normalized, line-by-line):\n{results.get(provider, {}).get('line_diff', '')}\n\n"
-            f"Diff (Normalized, word-by-word):\n{results.get(provider, {}).get('word_diff', '')}\n\n"
-            f"Metrics:\n{results.get(provider, {}).get('metrics', '')}"
-            for provider in providers
-        ]
-    else:
-        return [f"{results.get(provider, '')}" for provider in ["AZURE", "OPENAI"]]
+        normalized_expected = await asyncio.to_thread(
+            normalize_text, expected_transcription
+        )
+
+    # Normalization, diffs and metrics are CPU-bound, so they run per provider
+    # in a worker thread through request_providers
+    def format_result(provider, response):
+        if not expected_transcription:
+            return response.text
+        return format_transcription_result(
+            provider, response.text, expected_transcription, normalized_expected
+        )
+
+    async for provider, result in request_providers(
+        Task.TRANSCRIPTION,
+        providers,
+        TranscriptionRequest(audio_file=audio),
+        postprocess=format_result,
+    ):
+        if isinstance(result, Exception):
+            result = f"Error: {result}"
+        results[provider] = result
+
+        yield [results.get(provider, "") for provider in TRANSCRIPTION_PROVIDERS]
+
+
+def initialize_nltk():
+    # Only metrics need the nltk data. Data already on disk is used without a
+    # network call, and failed downloads are retried after NLTK_RETRY_INTERVAL
+    global nltk_ready, nltk_next_attempt
+    with nltk_lock:
+        if nltk_ready or time.time() < nltk_next_attempt:
+            return
+        import nltk
+
+        missing = []
+        for name, resource in NLTK_RESOURCES:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                missing.append(name)
+
+        downloads = [nltk.download(name) for name in missing]
+        nltk_ready = all(downloads)
+        if not nltk_ready:
+            nltk_next_attempt = time.time() + NLTK_RETRY_INTERVAL
 
 
 # Add this new function to calculate translation-specific metrics
 def calculate_translation_metrics(reference, hypothesis):
+    # Imported on first use, metrics are only needed with an expected text
+    from nltk.tokenize import word_tokenize
+    from nltk.translate.bleu_score import sentence_bleu as nltk_sentence_bleu
+    from nltk.translate.chrf_score import sentence_chrf
+    from nltk.translate.meteor_score import single_meteor_score
+    from sacrebleu import sentence_bleu
+
+    initialize_nltk()
 
     # Tokenize the input for METEOR score
     reference_tokens = word_tokenize(reference)
@@ -327,64 +683,81 @@ def language_name_to_code(language_name):
     return language_map.get(language_name, "en")  # Default to English if not found
 
 
-def process_translation(
+def format_translation_result(
+    provider,
+    translation,
+    source_lang,
+    target_lang,
+    expected_translation,
+    normalized_expected,
+):
+    normalized_translation = normalize_text(translation, task="translation")
+    line_diff = line_by_line_diff(normalized_expected, normalized_translation)
+    word_diff = word_by_word_diff(normalized_expected, normalized_translation)
+    metrics = calculate_translation_metrics(normalized_expected, normalized_translation)
+
+    return (
+        f"Translations ({source_lang} to {target_lang}):\n"
+        f"{provider}: {translation}\n"
+        f"Expected: {expected_translation}\n\n"
+        f"Normalized Translations:\n"
+        f"{provider}: {normalized_translation}\n"
+        f"Expected: {normalized_expected}\n\n"
+        f"Diff (Normalized, line-by-line):\n{line_diff}\n\n"
+        f"Diff (Normalized, word-by-word):\n{word_diff}\n\n"
+        f"Metrics:\n{metrics}"
+    )
+
+
+async def process_translation(
     text, providers, source_lang, target_lang, expected_translation=None
 ):
-    results = {}
     source_lang_code = language_name_to_code(source_lang)
     target_lang_code = language_name_to_code(target_lang)
 
-    for provider in providers:
-        client = supercontrast_client(
-            task=Task.TRANSLATION,
-            providers=[Provider[provider]],
-            source_language=source_lang_code,
-            target_language=target_lang_code,
+    # Empty string for providers not selected or still in flight
+    output = {}
+    yield [output.get(provider, "") for provider in TRANSLATION_PROVIDERS]
+
+    # The expected translation is shared by every provider, normalize it once
+    if expected_translation:
+        normalized_expected = await asyncio.to_thread(
+            normalize_text, expected_translation, task="translation"
+        )
+
+    # Normalization, diffs and metrics are CPU-bound, so they run per provider
+    # in a worker thread through request_providers
+    def format_result(provider, response):
+        if not expected_translation:
+            return response.text
+        return format_translation_result(
+            provider,
+            response.text,
+            source_lang,
+            target_lang,
+            expected_translation,
+            normalized_expected,
         )
-        response = client.request(TranslationRequest(text=text))
-        results[provider] = response.text
-
-    output = []
-    all_providers = ["ANTHROPIC", "AWS", "AZURE", "GCP", "MODERNMT", "OPENAI"]
-
-    for provider in all_providers:
-        if provider in providers:
-            if expected_translation:
-                normalized_expected = normalize_text(
-                    expected_translation, task="translation"
-                )
-                translation = results[provider]
-                normalized_translation = normalize_text(translation, task="translation")
-                line_diff = line_by_line_diff(
-                    normalized_expected, normalized_translation
-                )
-                word_diff = word_by_word_diff(
-                    normalized_expected, normalized_translation
-                )
-                metrics = calculate_translation_metrics(
-                    normalized_expected, normalized_translation
-                )
-
-                output.append(
-                    f"Translations ({source_lang} to {target_lang}):\n"
-                    f"{provider}: {translation}\n"
-                    f"Expected: {expected_translation}\n\n"
-                    f"Normalized Translations:\n"
-                    f"{provider}: {normalized_translation}\n"
-                    f"Expected: {normalized_expected}\n\n"
-                    f"Diff (Normalized, line-by-line):\n{line_diff}\n\n"
-                    f"Diff (Normalized, word-by-word):\n{word_diff}\n\n"
-                    f"Metrics:\n{metrics}"
-                )
-            else:
-                output.append(results[provider])
-        else:
-            output.append("")  # Empty string for providers not selected
 
-    return output
+    async for provider, result in request_providers(
+        Task.TRANSLATION,
+        providers,
+        TranslationRequest(text=text),
+        postprocess=format_result,
+        source_language=source_lang_code,
+        target_language=target_lang_code,
+    ):
+        if isinstance(result, Exception):
+            result = f"Error: {result}"
+        output[provider] = result
+
+        yield [output.get(provider, "") for provider in TRANSLATION_PROVIDERS]
 
 
 def gradio_demo():
+    threading.Thread(target=initialize_nltk, daemon=True).start()
+    setup_http_pooling()
+
     with gr.Blocks(
         css="""
         #title {
@@ -410,27 +783,35 @@ def gradio_demo():
     """
     ) as demo:
         gr.Markdown("# SuperContrast Demo", elem_id="title")
+        if RESPONSE_CACHE_ENABLED:
+            gr.Markdown(
+                "Provider responses are cached for up to 7 days. "
+                "Set `SUPERCONTRAST_RESPONSE_CACHE=0` to always call providers live."
+            )
 
         with gr.Tab("OCR"):
             ocr_input = gr.Image(type="filepath", label="Input Image")
             selected_providers = gr.CheckboxGroup(
-                choices=OCR_PROVIDERS, label="Providers"
+                choices=list(OCR_PROVIDERS), label="Providers"
             )
             ocr_button = gr.Button("Process OCR")
 
             # Dynamic output creation
             ocr_outputs = []
+            ocr_columns = []
             for provider in OCR_PROVIDERS:
                 with gr.Row():
                     with gr.Column(visible=False) as provider_column:
                         ocr_outputs.append(gr.Image(label=f"{provider} OCR Result"))
                         ocr_outputs.append(gr.Textbox(label=f"{provider} OCR Text"))
+                    ocr_columns.append(provider_column)
 
-                    selected_providers.change(
-                        lambda p, prov=provider: gr.update(visible=prov in p),
-                        inputs=[selected_providers],
-                        outputs=[provider_column],
-                    )
+            # Toggle every provider column from a single event
+            selected_providers.change(
+                lambda p: [gr.update(visible=prov in p) for prov in OCR_PROVIDERS],
+                inputs=[selected_providers],
+                outputs=ocr_columns,
+            )
 
             ocr_button.click(
                 process_ocr, inputs=[ocr_input, selected_providers], outputs=ocr_outputs
@@ -443,25 +824,29 @@ def gradio_demo():
                 placeholder="Enter expected transcription here",
             )
             transcription_providers = gr.CheckboxGroup(
-                choices=["AZURE", "OPENAI"], label="Providers"
+                choices=list(TRANSCRIPTION_PROVIDERS), label="Providers"
             )
             transcription_button = gr.Button("Process Transcription")
 
             # Dynamic output creation for transcription
             transcription_outputs = []
-            for i in range(0, len(["AZURE", "OPENAI"]), 2):
+            transcription_columns = []
+            for i in range(0, len(TRANSCRIPTION_PROVIDERS), 2):
                 with gr.Row():
-                    for provider in ["AZURE", "OPENAI"][i : i + 2]:
+                    for provider in TRANSCRIPTION_PROVIDERS[i : i + 2]:
                         with gr.Column(visible=False) as provider_column:
                             transcription_outputs.append(
                                 gr.Textbox(label=f"{provider} Transcription Result")
                             )
+                        transcription_columns.append(provider_column)
 
-                        transcription_providers.change(
-                            lambda p, prov=provider: gr.update(visible=prov in p),
-                            inputs=[transcription_providers],
-                            outputs=[provider_column],
-                        )
+            transcription_providers.change(
+                lambda p: [
+                    gr.update(visible=prov in p) for prov in TRANSCRIPTION_PROVIDERS
+                ],
+                inputs=[transcription_providers],
+                outputs=transcription_columns,
+            )
 
             transcription_button.click(
                 process_transcription,
@@ -487,27 +872,30 @@ def gradio_demo():
             )
             expected_translation = gr.Textbox(label="Expected Translation (Optional)")
             translation_providers = gr.CheckboxGroup(
-                ["ANTHROPIC", "AWS", "AZURE", "GCP", "MODERNMT", "OPENAI"],
+                list(TRANSLATION_PROVIDERS),
                 label="Providers",
             )
             translation_button = gr.Button("Translate")
 
             # Dynamic output creation for translation
             translation_outputs = []
-            providers = ["ANTHROPIC", "AWS", "AZURE", "GCP", "MODERNMT", "OPENAI"]
-            for i in range(0, len(providers), 2):
+            translation_columns = []
+            for i in range(0, len(TRANSLATION_PROVIDERS), 2):
                 with gr.Row():
-                    for provider in providers[i : i + 2]:
+                    for provider in TRANSLATION_PROVIDERS[i : i + 2]:
                         with gr.Column(visible=False) as provider_column:
                             translation_outputs.append(
                                 gr.Textbox(label=f"{provider} Translation Result")
                             )
+                        translation_columns.append(provider_column)
 
-                        translation_providers.change(
-                            lambda p, prov=provider: gr.update(visible=prov in p),
-                            inputs=[translation_providers],
-                            outputs=[provider_column],
-                        )
+            translation_providers.change(
+                lambda p: [
+                    gr.update(visible=prov in p) for prov in TRANSLATION_PROVIDERS
+                ],
+                inputs=[translation_providers],
+                outputs=translation_columns,
+            )
 
             translation_button.click(
                 process_translation,
@@ -521,7 +909,18 @@ def gradio_demo():
                 outputs=translation_outputs,
             )
 
-    demo.launch()
+    # Run the server's event loop on uvloop where available (not on Windows)
+    try:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+    try:
+        demo.launch()
+    finally:
+        teardown_http_pooling()
 
 
 if __name__ == "__main__":